@@ -0,0 +1 @@
+"""Training pipeline for the daily multi-horizon temperature models."""
@@ -0,0 +1,211 @@
+"""Feature engineering, multi-horizon targets and the cached time-based split.
+
+``feature_eng`` is the function from ``Step 4-5 Daily.ipynb``; the notebook and
+the tuner both import it from here so the features cannot drift apart.
+"""
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+DAY_TARGETS = ['temp_d', 'temp_d+1', 'temp_d+2', 'temp_d+3', 'temp_d+4']
+DAY_LABELS = ['Day 0', 'Day 1', 'Day 2', 'Day 3', 'Day 4']
+
+
+def load_raw(source):
+    """Read the raw daily weather table (xlsx or csv), sorted by datetime"""
+    if str(source).lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(source)
+    else:
+        df = pd.read_csv(source)
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    return df.sort_values("datetime")
+
+
+def feature_eng(df):
+    df = df.copy().sort_values(by = ['datetime'])
+    #drop uneeded data
+    columns_to_drop = [
+        'name', 'snow', 'snowdepth', 'name', 'stations', 'conditions','description', 'severerisk', 'sunset', 'sunrise', 'moonphase', 'precipprob', 'uvindex'
+    ]
+    df_cleaned = df.drop(columns=columns_to_drop, errors='ignore')
+
+    #create time feature
+    df_cleaned['month'] = df_cleaned['datetime'].dt.month
+    df_cleaned['dfy'] = df_cleaned['datetime'].dt.dayofyear
+    # df_cleaned['year'] = df_cleaned['datetime'].dt.year
+    # make sense the characteristics
+    df_cleaned['month_sin'] = np.sin(2 * np.pi * df_cleaned['month'] / 12)
+    df_cleaned['month_cos'] = np.cos(2 * np.pi * df_cleaned['month'] / 12)
+    df_cleaned['dfy_sin'] = np.sin(2 * np.pi * df_cleaned['dfy'] / 365)
+    df_cleaned['dfy_cos'] = np.cos(2 * np.pi * df_cleaned['dfy'] / 365)
+
+    time_df = df_cleaned[['month_sin', 'month_cos', 'dfy_sin', 'dfy_cos']]
+    
+    # ROLLING FEATURES
+    df_cleaned['winddir_sin'] = np.sin(np.deg2rad(df_cleaned['winddir']))
+    df_cleaned['winddir_cos'] = np.cos(np.deg2rad(df_cleaned['winddir']))
+    rolling_fea = ['winddir_cos', 'winddir_sin', 'dew', 'humidity', 'precip', 'precipcover', 'visibility', 'solarenergy', 'cloudcover', 'windspeed']
+    
+    # DERIVED FEATURES
+    derived = {}
+    derived['temp_range_lag1'] = df_cleaned['tempmax'].shift(1) - df_cleaned['tempmin'].shift(1)
+    derived['dew_temp_diff'] = df_cleaned['dew'].shift(1) - df_cleaned['temp'].shift(1)
+    derived['solar_per_cloud'] = df_cleaned['solarenergy'].shift(1) * (1- df_cleaned['cloudcover'].shift(1))/100
+    derived['humid_rad_ratio'] = df_cleaned['humidity'].shift(1)/ (df_cleaned['solarradiation'].shift(1)+1e-6)
+    derived['wind_humidity_interaction'] = df_cleaned['humidity'].shift(1) * (df_cleaned['windspeed'].shift(1)) / 100
+    derived['temp_humid'] = df_cleaned['temp'].shift(1) * df_cleaned['humidity'].shift(1)
+    derived['heat_index'] = df_cleaned['feelslike'].shift(1) - df_cleaned['temp'].shift(1)
+    derived['flmax_humid'] = df_cleaned['feelslikemax'].shift(1) * df_cleaned['humidity'].shift(1)/100
+    derived['flmin_cloud'] = df_cleaned['feelslikemin'].shift(1) * df_cleaned['cloudcover'].shift(1)/100
+    derived['sea_level_pressure_tendency'] = df_cleaned['sealevelpressure'].shift(1) - df_cleaned['sealevelpressure'].shift(6)
+    #df_cleaned['wind_dir'].head(10)
+    # interaction of solar energy and cloud cover
+    derived_df = pd.DataFrame(derived)
+    df_cleaned = pd.concat([df_cleaned, derived_df], axis=1)
+    
+    
+    
+    #onehot encode
+    nominal_cols = ['icon','preciptype']
+    df_encoded = pd.get_dummies(df_cleaned[nominal_cols], drop_first = True).astype(int)
+    df_no_cat = df_cleaned.drop(columns = nominal_cols, errors = 'ignore')
+    # Combine encoded features
+    df_cleaned = pd.concat([df_no_cat, df_encoded], axis = 1)
+    # print(df_cleaned.columns)
+    
+    # Season features
+    season = {}
+    for feature in ['humidity', 'dew', 'precip', 'windspeed']:
+        season[f'{feature}_seasonal'] = df_cleaned[feature].shift(1).rolling(3).max() - df_cleaned[feature].shift(1).rolling(7).max()
+        season[f'{feature}_trend'] = df_cleaned[feature].shift(1) - df_cleaned[feature].shift(2)
+        season[f'{feature}_derivative'] = season[f'{feature}_trend'].shift(1) - season [f'{feature}_trend'].shift(2)
+
+    season_df = pd.DataFrame(season)
+    df_cleaned = pd.concat([df_cleaned, season_df], axis = 1)
+    
+    rolling_columns = {}
+    for num in [7, 21, 42, 84, 126, 182]:
+        for feature in rolling_fea:
+            rolling_columns[f'{num}D_AVG_{feature}'] = df_cleaned[feature].shift(1).rolling(num).mean()
+            rolling_columns[f'{num}D_STD_{feature}'] = df_cleaned[feature].shift(1).rolling(num).std()
+        for feature in ['icon_partly-cloudy-day', 'icon_rain']:
+            rolling_columns[f'{num}D_AVG_{feature}'] = df_cleaned[feature].shift(1).rolling(num).mean()
+    rolling_columns_df = pd.DataFrame(rolling_columns)
+    df_cleaned = pd.concat([df_cleaned, rolling_columns_df], axis = 1)   
+
+    # df_fe = df_cleaned[['temp'] + time_features]
+    full_features = ['temp', 'datetime']  + list(derived_df.columns) + list(time_df.columns) + list(season_df.columns) + list(rolling_columns_df.columns)
+    df_fe = df_cleaned[full_features]
+    
+    # df_fe = df_fe.replace([np.inf, -np.inf], np.nan)
+    # df_fe = df_fe.select_dtypes(include=[np.number]).fillna(0)
+    # # 3. Drop NaNs 
+    # print(f'num of na: {df_fe.isna().sum()}')
+    df_fe = df_fe.fillna(0)
+
+
+    return df_fe
+
+
+def build_multi_horizon(df_fe):
+    """Split engineered features into X, the D+0..D+4 targets and dates"""
+    df_multi = df_fe.copy()
+    df_multi['temp_d'] = df_multi['temp']
+    for h in range(1, len(DAY_TARGETS)):
+        df_multi[f'temp_d+{h}'] = df_multi['temp'].shift(-h)
+
+    X_multi = df_multi.drop(columns=['temp', 'datetime'] + DAY_TARGETS)
+    y_multi = df_multi[DAY_TARGETS]
+    dates = df_multi['datetime']
+    return X_multi, y_multi, dates
+
+
+def time_split(X_multi, y_multi, dates, train_end, gap_months=9, validation_months=0):
+    """Chronological split used by the notebook.
+
+    Returns ``(X_train, y_train, X_eval, y_eval)``. With ``validation_months=0``
+    the eval set is the test period that starts ``gap_months`` after
+    ``train_end``. Otherwise the last ``validation_months`` before
+    ``train_end`` are held out as the eval set, so tuning never sees the test
+    period.
+    """
+    train_end = pd.Timestamp(train_end)
+    if validation_months:
+        eval_start = train_end - pd.DateOffset(months=validation_months)
+        train_mask = dates <= eval_start
+        eval_mask = (dates > eval_start) & (dates <= train_end)
+    else:
+        train_mask = dates <= train_end
+        eval_mask = dates >= train_end + pd.DateOffset(months=gap_months)
+
+    X_train, y_train = X_multi[train_mask].fillna(0), y_multi[train_mask]
+    X_eval, y_eval = X_multi[eval_mask].fillna(0), y_multi[eval_mask]
+
+    # Drop rows whose targets run past the end of the data
+    train_valid_idx = y_train.dropna().index
+    eval_valid_idx = y_eval.dropna().index
+    return (X_train.loc[train_valid_idx], y_train.loc[train_valid_idx],
+            X_eval.loc[eval_valid_idx], y_eval.loc[eval_valid_idx])
+
+
+def _fingerprint(source, split):
+    digest = hashlib.sha1()
+    with open(source, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(json.dumps(split, sort_keys=True).encode())
+    # Editing the feature code must invalidate the cache (and the trial keys built on it)
+    for func in (feature_eng, build_multi_horizon, time_split):
+        digest.update(inspect.getsource(func).encode())
+    return digest.hexdigest()
+
+
+def load_feature_cache(source, split, cache_dir, mmap=True):
+    """Build (once) and load the float32 feature matrix for ``split``.
+
+    The arrays are stored as ``.npy`` files under ``cache_dir`` together with a
+    ``meta.json`` fingerprint of the source file, split settings and feature
+    code, and are rebuilt only when that fingerprint changes. With ``mmap=True`` the arrays
+    are memory-mapped read-only, so every worker process shares the same pages.
+    """
+    fingerprint = _fingerprint(source, split)
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    meta = None
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+    if meta is None or meta.get('fingerprint') != fingerprint:
+        os.makedirs(cache_dir, exist_ok=True)
+        X_multi, y_multi, dates = build_multi_horizon(feature_eng(load_raw(source)))
+        X_train, y_train, X_eval, y_eval = time_split(X_multi, y_multi, dates, **split)
+        arrays = {
+            'X_train': X_train.to_numpy(dtype=np.float32),
+            'y_train': y_train.to_numpy(dtype=np.float32),
+            'X_eval': X_eval.to_numpy(dtype=np.float32),
+            'y_eval': y_eval.to_numpy(dtype=np.float32),
+        }
+        for name, arr in arrays.items():
+            np.save(os.path.join(cache_dir, f'{name}.npy'), arr)
+        meta = {'fingerprint': fingerprint, 'columns': list(X_train.columns), 'split': split}
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        print(f"✓ Built feature cache in {cache_dir} ({len(X_train)} train / {len(X_eval)} eval rows)")
+
+    return open_feature_cache(cache_dir, mmap=mmap)
+
+
+def open_feature_cache(cache_dir, mmap=True):
+    """Load an already built feature cache without checking its fingerprint"""
+    with open(os.path.join(cache_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    mode = 'r' if mmap else None
+    data = {name: np.load(os.path.join(cache_dir, f'{name}.npy'), mmap_mode=mode)
+            for name in ('X_train', 'y_train', 'X_eval', 'y_eval')}
+    data['columns'] = meta['columns']
+    data['fingerprint'] = meta['fingerprint']
+    return data
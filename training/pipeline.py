@@ -0,0 +1,68 @@
+"""Config-driven model construction for the daily training notebook.
+
+Hyperparameters live in ``training/config.json`` (one entry per model family
+and horizon) so that the tuner can write its best configurations straight into
+the pipeline instead of them being edited by hand in the notebook.
+"""
+import json
+import os
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_PATH = os.path.join(REPO_ROOT, 'training', 'config.json')
+
+MODEL_NAMES = ['XGBoost', 'CatBoost', 'AdaBoost']
+
+
+def load_config(path=CONFIG_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_config(config, path=CONFIG_PATH):
+    """Write ``config`` atomically so an interrupted write never truncates it"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(config, f, indent=2)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def model_class(name):
+    """Import the estimator class for ``name`` on demand"""
+    if name == 'XGBoost':
+        from xgboost import XGBRegressor
+        return XGBRegressor
+    if name == 'CatBoost':
+        from catboost import CatBoostRegressor
+        return CatBoostRegressor
+    if name == 'AdaBoost':
+        from sklearn.ensemble import AdaBoostRegressor
+        return AdaBoostRegressor
+    raise ValueError(f"Unknown model: {name}")
+
+
+def model_params(name, day_label, config=None):
+    config = config if config is not None else load_config()
+    return dict(config['models'][name][day_label])
+
+
+def build_model(name, day_label, config=None, **overrides):
+    """Instantiate ``name`` with the configured parameters for ``day_label``"""
+    params = model_params(name, day_label, config)
+    params.update(overrides)
+    return model_class(name)(**params)
+
+
+def fit_model(name, model, X_train, y_train, X_eval, y_eval):
+    """Fit ``model`` the way the notebook does, using the eval set where supported"""
+    if name == "XGBoost":
+        model.fit(X_train, y_train,
+                  eval_set=[(X_train, y_train), (X_eval, y_eval)],
+                  verbose=False)
+    elif name == "CatBoost":
+        model.fit(X_train, y_train,
+                  eval_set=(X_eval, y_eval),
+                  use_best_model=True)
+    else:
+        model.fit(X_train, y_train)
+    return model
@@ -0,0 +1,162 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from . import features
+from .pipeline import load_config
+from .tune import Bracket, TrialLog, make_brackets, write_best
+
+
+class MakeBracketsTests(unittest.TestCase):
+    def test_hyperband_schedule(self):
+        brackets = make_brackets(['XGBoost'], [0], 50, 2000, 3, 'hyperband', seed=42)
+        # s_max = floor(log3(2000 / 50)) = 3, so brackets s = 3, 2, 1, 0
+        self.assertEqual([b.s for b in brackets], [3, 2, 1, 0])
+        self.assertEqual([len(b.active) for b in brackets], [27, 12, 6, 4])
+        self.assertEqual([b.budget() for b in brackets], [74, 222, 667, 2000])
+
+    def test_successive_halving_is_one_bracket_per_target(self):
+        brackets = make_brackets(['XGBoost', 'CatBoost'], [0, 1, 2], 50, 2000, 3, 'sh', seed=42)
+        self.assertEqual(len(brackets), 6)
+        self.assertTrue(all(b.s == 3 and len(b.active) == 27 for b in brackets))
+
+
+class PromoteTests(unittest.TestCase):
+    def rung_results(self, bracket):
+        return {config_id: {'rmse': float(config_id)} for config_id, _ in bracket.active}
+
+    def test_keeps_best_fraction(self):
+        bracket = Bracket('XGBoost', 0, 3, 27, 50, 2000, 3, seed=42)
+        bracket.active.reverse()
+        bracket.promote(self.rung_results(bracket))
+        self.assertEqual([config_id for config_id, _ in bracket.active], list(range(9)))
+        self.assertEqual(bracket.rung, 1)
+
+    def test_keeps_at_least_one(self):
+        bracket = Bracket('XGBoost', 0, 1, 2, 50, 150, 3, seed=42)
+        bracket.promote(self.rung_results(bracket))
+        self.assertEqual([config_id for config_id, _ in bracket.active], [0])
+
+
+class TrialLogTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'trials.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_resume_skips_truncated_last_line(self):
+        log = TrialLog(self.path)
+        log.record({'key': 'a', 'rmse': 1.0})
+        log.record({'key': 'b', 'rmse': 2.0})
+        with open(self.path, 'a') as f:
+            f.write('{"key": "c", "rm')
+
+        resumed = TrialLog(self.path)
+        self.assertEqual(sorted(resumed.results), ['a', 'b'])
+        self.assertEqual(resumed.results['b']['rmse'], 2.0)
+
+
+class TrialKeyTests(unittest.TestCase):
+    def keys(self, bracket, early_stopping=50):
+        return [t['key'] for t in bracket.tasks('f' * 40, early_stopping, threads=1)]
+
+    def test_rerun_with_other_settings_does_not_resume(self):
+        base = self.keys(Bracket('XGBoost', 0, 1, 3, 50, 150, 3, seed=42))
+        self.assertEqual(base, self.keys(Bracket('XGBoost', 0, 1, 3, 50, 150, 3, seed=42)))
+        for other in (
+            self.keys(Bracket('XGBoost', 0, 1, 3, 50, 150, 3, seed=7)),
+            self.keys(Bracket('XGBoost', 0, 1, 3, 50, 150, 2, seed=42)),
+            self.keys(Bracket('XGBoost', 0, 1, 3, 60, 150, 3, seed=42)),
+            self.keys(Bracket('XGBoost', 0, 1, 3, 50, 150, 3, seed=42), early_stopping=20),
+        ):
+            self.assertFalse(set(base) & set(other))
+
+
+def synthetic_raw(source):
+    dates = pd.date_range('2020-01-01', periods=40, freq='D')
+    return pd.DataFrame({'datetime': dates, 'temp': [25.0 + i % 7 for i in range(40)]})
+
+
+def feature_eng_v1(df):
+    return pd.DataFrame({'temp': df['temp'], 'datetime': df['datetime'], 'lag1': df['temp'].shift(1).fillna(0)})
+
+
+def feature_eng_v2(df):
+    return pd.DataFrame({'temp': df['temp'], 'datetime': df['datetime'], 'lag1': df['temp'].shift(2).fillna(0)})
+
+
+class FeatureCacheTests(unittest.TestCase):
+    split = {'train_end': '2020-01-25', 'gap_months': 0}
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp, 'raw.csv')
+        with open(self.source, 'w') as f:
+            f.write('unchanged source\n')
+        self.cache_dir = os.path.join(self.tmp, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def load(self, feature_eng):
+        with mock.patch.object(features, 'load_raw', synthetic_raw), \
+                mock.patch.object(features, 'feature_eng', feature_eng):
+            return features.load_feature_cache(self.source, self.split, self.cache_dir, mmap=False)
+
+    def test_changed_feature_code_rebuilds_cache_and_trial_keys(self):
+        old = self.load(feature_eng_v1)
+        self.assertEqual(self.load(feature_eng_v1)['fingerprint'], old['fingerprint'])
+
+        new = self.load(feature_eng_v2)
+        self.assertNotEqual(new['fingerprint'], old['fingerprint'])
+        self.assertNotEqual(new['X_train'][:, 0].tolist(), old['X_train'][:, 0].tolist())
+
+        bracket = Bracket('XGBoost', 0, 1, 3, 50, 150, 3, seed=42)
+        old_keys = {t['key'] for t in bracket.tasks(old['fingerprint'], 50, threads=1)}
+        new_keys = {t['key'] for t in bracket.tasks(new['fingerprint'], 50, threads=1)}
+        self.assertFalse(old_keys & new_keys)
+
+
+class WriteBestTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'config.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_writes_budget_and_omits_trial_only_params(self):
+        config = load_config()
+        best = {
+            ('XGBoost', 0): {'rmse': 0.8, 'best_iteration': 163, 'threads': 4,
+                             'params': {'learning_rate': 0.04, 'max_depth': 3}},
+            ('CatBoost', 1): {'rmse': 0.9, 'best_iteration': 22, 'threads': 4,
+                              'params': {'learning_rate': 0.17, 'depth': 4}},
+        }
+        write_best(best, config, self.path, {('XGBoost', 0): 10, ('CatBoost', 1): 10})
+
+        with open(self.path) as f:
+            written = json.load(f)
+        xgb = written['models']['XGBoost']['Day 0']
+        cat = written['models']['CatBoost']['Day 1']
+        self.assertEqual(xgb['n_estimators'], 164)
+        self.assertEqual(xgb['max_depth'], 3)
+        self.assertEqual(xgb['early_stopping_rounds'], 100)
+        self.assertEqual(cat['iterations'], 23)
+        self.assertNotIn('n_jobs', xgb)
+        self.assertNotIn('thread_count', cat)
+        self.assertNotIn('allow_writing_files', cat)
+        self.assertEqual(written['tuning']['XGBoost']['Day 0']['trials'], 10)
+        # Untouched horizons keep their configured values
+        self.assertEqual(written['models']['XGBoost']['Day 1'], config['models']['XGBoost']['Day 1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,308 @@
+"""Hyperband / successive-halving search for the per-horizon boosting models.
+
+Every trial trains on the same cached, memory-mapped feature matrix and
+time-based split (see ``features.load_feature_cache``) and stops early on the
+held-out eval set. Trials of all horizons and model families run side by side
+in a process pool, one rung at a time; after each rung only the best
+``1/eta`` configurations of a bracket are promoted to a larger budget.
+
+Finished trials are appended to a JSONL checkpoint, so re-running the same
+command after an interruption skips everything already evaluated. The best
+configuration per model and horizon is written into ``training/config.json``.
+
+Usage (from the repository root)::
+
+    python -m training.tune --models XGBoost CatBoost --workers 8
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from .features import DAY_LABELS, load_feature_cache, open_feature_cache
+from .pipeline import CONFIG_PATH, REPO_ROOT, load_config, model_class, save_config
+
+# (kind, low, high) per hyperparameter; 'log' samples uniformly in log space
+SEARCH_SPACES = {
+    'XGBoost': {
+        'learning_rate': ('log', 0.005, 0.2),
+        'max_depth': ('int', 2, 8),
+        'min_child_weight': ('int', 1, 10),
+        'subsample': ('float', 0.5, 1.0),
+        'colsample_bytree': ('float', 0.3, 1.0),
+        'reg_alpha': ('log', 1e-6, 1.0),
+        'reg_lambda': ('log', 1e-6, 10.0),
+    },
+    'CatBoost': {
+        'learning_rate': ('log', 0.005, 0.2),
+        'depth': ('int', 3, 8),
+        'l2_leaf_reg': ('log', 0.5, 20.0),
+        'subsample': ('float', 0.5, 1.0),
+        'rsm': ('float', 0.3, 1.0),
+    },
+}
+
+# Parameter that controls the number of boosting rounds (the halving budget)
+BUDGET_PARAMS = {'XGBoost': 'n_estimators', 'CatBoost': 'iterations'}
+
+FIXED_PARAMS = {
+    'XGBoost': {'random_state': 42, 'eval_metric': 'rmse'},
+    'CatBoost': {'loss_function': 'RMSE', 'eval_metric': 'RMSE', 'random_seed': 42, 'verbose': False},
+}
+
+# Only used while tuning, never written back to the pipeline config
+TRIAL_ONLY_PARAMS = {
+    'XGBoost': lambda threads: {'n_jobs': threads},
+    'CatBoost': lambda threads: {'thread_count': threads, 'allow_writing_files': False},
+}
+
+
+def sample_config(space, rng):
+    params = {}
+    for key, (kind, low, high) in space.items():
+        if kind == 'int':
+            params[key] = int(rng.integers(low, high + 1))
+        elif kind == 'log':
+            params[key] = float(math.exp(rng.uniform(math.log(low), math.log(high))))
+        else:
+            params[key] = float(rng.uniform(low, high))
+    return params
+
+
+# --- worker side -----------------------------------------------------------
+
+_worker_data = None
+
+
+def _init_worker(cache_dir):
+    global _worker_data
+    _worker_data = open_feature_cache(cache_dir, mmap=True)
+
+
+def run_trial(task):
+    """Train one configuration at one budget and score it on the eval set"""
+    name, horizon = task['model'], task['horizon']
+    data = _worker_data
+    y_train = np.asarray(data['y_train'][:, horizon])
+    y_eval = np.asarray(data['y_eval'][:, horizon])
+
+    params = dict(FIXED_PARAMS[name])
+    params.update(task['params'])
+    params.update(TRIAL_ONLY_PARAMS[name](task['threads']))
+    params[BUDGET_PARAMS[name]] = task['budget']
+
+    started = time.perf_counter()
+    if name == 'XGBoost':
+        model = model_class(name)(early_stopping_rounds=task['early_stopping'], **params)
+        model.fit(data['X_train'], y_train, eval_set=[(data['X_eval'], y_eval)], verbose=False)
+        rmse, best_iteration = float(model.best_score), int(model.best_iteration)
+    else:
+        model = model_class(name)(**params)
+        model.fit(data['X_train'], y_train, eval_set=(data['X_eval'], y_eval),
+                  early_stopping_rounds=task['early_stopping'], use_best_model=True)
+        rmse = float(model.get_best_score()['validation']['RMSE'])
+        best_iteration = int(model.get_best_iteration())
+
+    result = dict(task)
+    result.update({
+        'rmse': rmse,
+        'best_iteration': best_iteration,
+        'seconds': round(time.perf_counter() - started, 3),
+    })
+    return result
+
+
+# --- search side -----------------------------------------------------------
+
+class TrialLog:
+    """Append-only JSONL checkpoint of finished trials"""
+
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        result = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A trial interrupted mid-write; it will simply be re-run
+                        continue
+                    self.results[result['key']] = result
+
+    def record(self, result):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.results[result['key']] = result
+
+
+def trial_key(fingerprint, model, horizon, bracket, config_id, budget, params, search):
+    """Checkpoint key; hashes the params and search settings so that a rerun with
+    a different seed, eta, budget or early stopping never reuses old results"""
+    settings_hash = hashlib.sha1(
+        json.dumps({'params': params, 'search': search}, sort_keys=True).encode()).hexdigest()[:12]
+    return f"{fingerprint[:12]}|{model}|h{horizon}|s{bracket}|c{config_id}|r{budget}|{settings_hash}"
+
+
+class Bracket:
+    """One successive-halving bracket for a (model, horizon) pair"""
+
+    def __init__(self, model, horizon, s, n_configs, min_budget, max_budget, eta, seed):
+        self.model, self.horizon, self.s, self.eta = model, horizon, s, eta
+        self.max_budget = max_budget
+        self.min_budget = max_budget * eta ** -s
+        # Everything besides the sampled params that shapes a trial's result
+        self.search = {'seed': seed, 'eta': eta, 'min_budget': min_budget, 'max_budget': max_budget}
+        rng = np.random.default_rng([seed, zlib.crc32(model.encode()), horizon, s])
+        self.active = [(i, sample_config(SEARCH_SPACES[model], rng)) for i in range(n_configs)]
+        self.rung = 0
+
+    @property
+    def done(self):
+        return self.rung > self.s or not self.active
+
+    def budget(self):
+        return min(self.max_budget, int(round(self.min_budget * self.eta ** self.rung)))
+
+    def tasks(self, fingerprint, early_stopping, threads):
+        budget = self.budget()
+        for config_id, params in self.active:
+            key = trial_key(fingerprint, self.model, self.horizon, self.s, config_id, budget,
+                            params, dict(self.search, early_stopping=early_stopping))
+            yield {
+                'key': key, 'model': self.model, 'horizon': self.horizon, 'bracket': self.s,
+                'config_id': config_id, 'rung': self.rung, 'budget': budget, 'params': params,
+                'early_stopping': early_stopping, 'threads': threads,
+            }
+
+    def promote(self, results):
+        """Keep the best ``1/eta`` of the current rung for the next one"""
+        scored = sorted(self.active, key=lambda item: results[item[0]]['rmse'])
+        keep = max(1, len(scored) // self.eta)
+        self.active = scored[:keep]
+        self.rung += 1
+
+
+def make_brackets(models, horizons, min_budget, max_budget, eta, mode, seed):
+    s_max = max(0, int(math.floor(math.log(max_budget / min_budget, eta) + 1e-9)))
+    if mode == 'sh':
+        schedule = [(s_max, eta ** s_max)]
+    else:
+        schedule = [(s, int(math.ceil((s_max + 1) / (s + 1) * eta ** s))) for s in range(s_max, -1, -1)]
+    return [Bracket(model, horizon, s, n, min_budget, max_budget, eta, seed)
+            for model in models for horizon in horizons for s, n in schedule]
+
+
+def run_search(brackets, cache_dir, fingerprint, log, workers, early_stopping, threads):
+    """Run all brackets rung by rung, evaluating each rung's trials in parallel"""
+    all_results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_dir,)) as pool:
+        while True:
+            active = [b for b in brackets if not b.done]
+            if not active:
+                break
+            tasks = {b: list(b.tasks(fingerprint, early_stopping, threads)) for b in active}
+            pending = [t for ts in tasks.values() for t in ts if t['key'] not in log.results]
+            resumed = sum(len(ts) for ts in tasks.values()) - len(pending)
+            print(f"✓ Rung batch: {len(pending)} trials to run, {resumed} resumed from checkpoint")
+            # Checkpoint each trial as soon as it finishes, not in submission order
+            errors = []
+            for future in as_completed([pool.submit(run_trial, t) for t in pending]):
+                try:
+                    log.record(future.result())
+                except Exception as e:
+                    errors.append(e)
+            if errors:
+                raise errors[0]
+            for bracket, ts in tasks.items():
+                rung_results = {t['config_id']: log.results[t['key']] for t in ts}
+                all_results.extend(rung_results.values())
+                bracket.promote(rung_results)
+    return all_results
+
+
+def best_per_target(results):
+    """Lowest eval RMSE per (model, horizon)"""
+    best = {}
+    for r in results:
+        key = (r['model'], r['horizon'])
+        if key not in best or r['rmse'] < best[key]['rmse']:
+            best[key] = r
+    return best
+
+
+def write_best(best, config, config_path, trial_counts):
+    for (name, horizon), r in sorted(best.items()):
+        day_label = DAY_LABELS[horizon]
+        params = dict(config['models'][name][day_label])
+        params.update(FIXED_PARAMS[name])
+        params.update(r['params'])
+        params[BUDGET_PARAMS[name]] = r['best_iteration'] + 1
+        config['models'][name][day_label] = params
+        config.setdefault('tuning', {}).setdefault(name, {})[day_label] = {
+            'eval_rmse': round(r['rmse'], 5),
+            'trials': trial_counts[(name, horizon)],
+        }
+        print(f"✓ {name} {day_label}: eval RMSE {r['rmse']:.4f} "
+              f"({BUDGET_PARAMS[name]}={params[BUDGET_PARAMS[name]]})")
+    save_config(config, config_path)
+    print(f"✓ Best configs written to {config_path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--models', nargs='+', default=list(SEARCH_SPACES), choices=list(SEARCH_SPACES))
+    parser.add_argument('--horizons', nargs='+', type=int, default=list(range(len(DAY_LABELS))))
+    parser.add_argument('--mode', choices=['hyperband', 'sh'], default='hyperband',
+                        help="'sh' runs a single successive-halving bracket")
+    parser.add_argument('--min-budget', type=int, default=50, help='boosting rounds at the first rung')
+    parser.add_argument('--max-budget', type=int, default=2000, help='boosting rounds at the last rung')
+    parser.add_argument('--eta', type=int, default=3, help='halving rate')
+    parser.add_argument('--early-stopping', type=int, default=50, help='eval-set early stopping rounds')
+    parser.add_argument('--validation-months', type=int, default=12,
+                        help='months before train_end held out as the eval set')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--threads-per-trial', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--config', default=CONFIG_PATH)
+    parser.add_argument('--cache-dir', default=os.path.join(REPO_ROOT, 'training', 'cache'))
+    parser.add_argument('--checkpoint', default=os.path.join(REPO_ROOT, 'training', 'tuning', 'trials.jsonl'))
+    parser.add_argument('--no-write', action='store_true', help='report the best configs without saving them')
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    split = dict(config['split'], validation_months=args.validation_months)
+    source = os.path.join(REPO_ROOT, config['source'])
+    data = load_feature_cache(source, split, args.cache_dir)
+
+    brackets = make_brackets(args.models, args.horizons, args.min_budget, args.max_budget,
+                             args.eta, args.mode, args.seed)
+    log = TrialLog(args.checkpoint)
+    results = run_search(brackets, args.cache_dir, data['fingerprint'], log,
+                         args.workers, args.early_stopping, args.threads_per_trial)
+
+    trial_counts = {}
+    for r in results:
+        trial_counts[(r['model'], r['horizon'])] = trial_counts.get((r['model'], r['horizon']), 0) + 1
+    best = best_per_target(results)
+    if args.no_write:
+        for (name, horizon), r in sorted(best.items()):
+            print(f"{name} {DAY_LABELS[horizon]}: eval RMSE {r['rmse']:.4f} {r['params']}")
+    else:
+        write_best(best, config, args.config, trial_counts)
+
+
+if __name__ == '__main__':
+    main()
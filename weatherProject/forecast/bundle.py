@@ -0,0 +1,209 @@
+"""Ahead-of-time rendered forecast pages.
+
+``manage.py prerender_forecasts`` renders every known date of a city into
+``FORECAST_BUNDLE_ROOT/<slug>/`` as gzip-compressed HTML and chart JSON, plus a
+``manifest.json``. Each manifest entry records a fingerprint of the inputs the
+page depends on, so an incremental rebuild only re-renders dates whose inputs
+changed. The views serve a prebuilt file when the manifest knows the date and
+fall back to live rendering otherwise.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+
+# Rows from the selected date onward that a page reads (forecast box is up to 7 days)
+WINDOW_ROWS = 8
+
+CONTENT_TYPES = {
+    'html': 'text/html; charset=utf-8',
+    'json': 'application/json',
+}
+
+
+def bundle_dir(slug):
+    return os.path.join(str(settings.FORECAST_BUNDLE_ROOT), slug)
+
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+_renderer_fingerprint = None
+
+
+def renderer_fingerprint():
+    """Hash of the code and template that turn a context into a page"""
+    global _renderer_fingerprint
+    if _renderer_fingerprint is None:
+        app_dir = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha1()
+        for name in ('views.py', os.path.join('templates', 'weather.html')):
+            with open(os.path.join(app_dir, name), 'rb') as f:
+                digest.update(f.read())
+        digest.update(str(settings.STATIC_URL).encode())
+        _renderer_fingerprint = digest.hexdigest()
+    return _renderer_fingerprint
+
+
+def date_fingerprints(shard):
+    """Map each renderable date of ``shard`` to a fingerprint of its inputs.
+
+    A page for date D reads the history rows from D onward (forecast box and
+    chart), the prediction row for D, and city-wide values such as
+    ``max_date``. Only those are hashed, so editing one day of history only
+    invalidates the handful of pages that display it.
+    """
+    history = shard.history
+    if history is None or 'datetime' not in history.columns or history.empty:
+        return {}
+    history = history.sort_values('datetime', kind='stable').reset_index(drop=True)
+    row_hashes = pd.util.hash_pandas_object(history, index=False).to_numpy()
+    dates = history['datetime'].dt.strftime('%Y-%m-%d').to_numpy()
+
+    pred_hashes = {}
+    predictions = shard.predictions
+    if predictions is not None and 'datetime' in predictions.columns:
+        pred_dates = predictions['datetime'].dt.strftime('%Y-%m-%d').to_numpy()
+        hashes = pd.util.hash_pandas_object(predictions, index=False).to_numpy()
+        for d, h in zip(pred_dates, hashes):
+            pred_hashes.setdefault(d, []).append(int(h))
+        columns = ','.join(map(str, predictions.columns))
+    else:
+        columns = ''
+
+    city_inputs = json.dumps([renderer_fingerprint(), shard.name, shard.slug, shard.country,
+                              shard.max_date, shard.default_date, list(history.columns), columns])
+
+    fingerprints = {}
+    for i, d in enumerate(dates):
+        if d in fingerprints:
+            continue
+        digest = hashlib.sha1(city_inputs.encode())
+        digest.update(row_hashes[i:i + WINDOW_ROWS].tobytes())
+        digest.update(json.dumps(pred_hashes.get(d, [])).encode())
+        fingerprints[d] = digest.hexdigest()
+    return fingerprints
+
+
+def render_date(shard, date_str):
+    """Rendered HTML and chart JSON (both uncompressed bytes) for one date"""
+    from django.template.loader import render_to_string
+    from .views import build_weather_context, chart_payload
+
+    context = build_weather_context(shard, date_str)
+    html = render_to_string('weather.html', context).encode()
+    chart = json.dumps(chart_payload(context)).encode()
+    return html, chart
+
+
+def render_dates(slug, dates):
+    """Render and write ``dates`` of city ``slug``; returns their manifest entries"""
+    from .shards import get_shard
+
+    shard = get_shard(slug)
+    out_dir = bundle_dir(slug)
+    entries = {}
+    for date_str in dates:
+        html, chart = render_date(shard, date_str)
+        entry = {'etag': hashlib.sha1(html).hexdigest()[:20]}
+        for kind, data in (('html', html), ('json', chart)):
+            filename = f"{date_str}.{kind}.gz"
+            write_atomic(os.path.join(out_dir, filename), gzip.compress(data, compresslevel=9, mtime=0))
+            entry[kind] = filename
+        entries[date_str] = entry
+    return entries
+
+
+def init_worker():
+    """Process pool initializer (needed when workers are spawned, not forked)"""
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weatherProject.settings')
+    django.setup()
+
+
+# --- serving --------------------------------------------------------------
+
+def accepts_gzip(accept_encoding):
+    """Whether an ``Accept-Encoding`` header allows gzip, honouring q-values"""
+    qualities = {}
+    for coding in accept_encoding.lower().split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            qualities[name] = q
+    q = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+    return q > 0
+
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def load_manifest(slug):
+    """Current manifest for ``slug`` (None if absent or built by other code)"""
+    path = os.path.join(bundle_dir(slug), 'manifest.json')
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    with _manifests_lock:
+        cached = _manifests.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('renderer') != renderer_fingerprint():
+        manifest = None
+    with _manifests_lock:
+        _manifests[path] = (mtime, manifest)
+    return manifest
+
+
+def prebuilt_response(request, slug, date_str, kind):
+    """Serve the prebuilt ``kind`` ('html' or 'json') file, or None if there is none"""
+    # Only configured cities may reach the filesystem; anything else (including
+    # removed cities and paths like '..') goes to the live view, which 404s
+    if slug not in settings.FORECAST_CITIES:
+        return None
+    manifest = load_manifest(slug)
+    if manifest is None:
+        return None
+    entry = manifest['dates'].get(date_str or manifest.get('default_date'))
+    if entry is None:
+        return None
+
+    use_gzip = accepts_gzip(request.headers.get('Accept-Encoding', ''))
+    etag = f'"{entry["etag"]}-{kind}{"-gz" if use_gzip else ""}"'
+    response_headers = {'ETag': etag, 'Vary': 'Accept-Encoding'}
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponseNotModified(headers=response_headers)
+    try:
+        with open(os.path.join(bundle_dir(slug), entry[kind]), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if use_gzip:
+        response_headers['Content-Encoding'] = 'gzip'
+    else:
+        data = gzip.decompress(data)
+    return HttpResponse(data, content_type=CONTENT_TYPES[kind], headers=response_headers)
@@ -0,0 +1,214 @@
+"""Memoized per-horizon model predictions.
+
+Predictions are keyed by city, horizon, model version (content hash of the
+``Best_Day N.pkl`` artifact) and a hash of the float32 feature vector, and
+cached in two tiers:
+
+1. an in-process LRU of ``FORECAST_PREDICTION_CACHE_SIZE`` entries, and
+2. a SQLite file at ``FORECAST_PREDICTION_CACHE_PATH`` shared by all workers
+   and kept across restarts (set the path to None to disable this tier).
+
+Because the model version is part of the key, replacing an artifact in
+``best_models/`` makes old entries unreachable; they are also purged from the
+SQLite tier the first time a worker sees the new version.
+
+The SQLite tier is best effort: if the file cannot be opened, read or written
+(bad path, ``database is locked``, ...), the failure is logged once and the
+lookup carries on with the memory tier and the model itself.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+def feature_fingerprint(features):
+    """Fast hash of a feature vector after casting it to contiguous float32"""
+    data = np.ascontiguousarray(features, dtype=np.float32).ravel()
+    return hashlib.blake2b(data.tobytes(), digest_size=16).hexdigest()
+
+
+class PredictionCache:
+    """Two-tier (memory LRU + SQLite) cache of model outputs"""
+
+    def __init__(self, path=None, max_entries=4096):
+        self.path = str(path) if path else None
+        self.max_entries = max_entries
+        # Guards the LRU, the seen versions and the counters only; SQLite
+        # calls run outside it on a connection owned by the calling thread
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._seen_versions = {}
+        self._disk_error_logged = False
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.inference_seconds = 0.0
+
+    def _db(self):
+        # One connection per thread; reopen after a fork
+        if self.path is None:
+            return None
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS predictions ('
+                    ' key TEXT PRIMARY KEY, city TEXT NOT NULL, horizon INTEGER NOT NULL,'
+                    ' version TEXT NOT NULL, value REAL NOT NULL, inference_seconds REAL NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS predictions_model ON predictions (city, horizon, version)')
+                conn.commit()
+            except sqlite3.Error:
+                conn.close()
+                raise
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _with_db(self, action):
+        """``action(conn)`` on this thread's connection; None if the disk tier is off or failing"""
+        if self.path is None:
+            return None
+        try:
+            return action(self._db())
+        except (sqlite3.Error, OSError) as exc:
+            # Drop the connection (it may be mid-transaction) and reopen on the next call
+            conn = getattr(self._local, 'conn', None)
+            self._local.conn = None
+            if conn is not None:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            with self._lock:
+                first, self._disk_error_logged = not self._disk_error_logged, True
+            if first:
+                logger.warning('Prediction cache at %s is unavailable, using memory only: %s', self.path, exc)
+            return None
+
+    def _observe_version(self, city, horizon, version):
+        """Purge entries of older artifacts the first time ``version`` is seen"""
+        with self._lock:
+            if self._seen_versions.get((city, horizon)) == version:
+                return
+            self._seen_versions[(city, horizon)] = version
+            stale = [k for k in self._memory if k[0] == city and k[1] == horizon and k[2] != version]
+            for k in stale:
+                del self._memory[k]
+
+        def purge(db):
+            db.execute('DELETE FROM predictions WHERE city = ? AND horizon = ? AND version != ?',
+                       (city, horizon, version))
+            db.commit()
+        self._with_db(purge)
+
+    def get_or_compute(self, city, horizon, version, features, compute):
+        """Cached value for this feature vector, calling ``compute()`` on a miss"""
+        key = (city, horizon, version, feature_fingerprint(features))
+        self._observe_version(city, horizon, version)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.saved_seconds += entry[1]
+                return entry[0]
+
+        disk_key = '|'.join(map(str, key))
+        row = self._with_db(lambda db: db.execute(
+            'SELECT value, inference_seconds FROM predictions WHERE key = ?', (disk_key,)).fetchone())
+        if row is not None:
+            with self._lock:
+                self._remember(key, row)
+                self.disk_hits += 1
+                self.saved_seconds += row[1]
+            return row[0]
+
+        started = time.perf_counter()
+        value = float(compute())
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.misses += 1
+            self.inference_seconds += elapsed
+            self._remember(key, (value, elapsed))
+
+        def store(db):
+            db.execute('INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?)',
+                       (disk_key, city, horizon, version, value, elapsed))
+            db.commit()
+        self._with_db(store)
+        return value
+
+    def _remember(self, key, entry):
+        self._memory[key] = tuple(entry)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        # Never create the SQLite file just to report on it
+        disk_entries = None
+        if self.path is not None and (getattr(self._local, 'conn', None) is not None
+                                      or os.path.exists(self.path)):
+            disk_entries = self._with_db(
+                lambda db: db.execute('SELECT COUNT(*) FROM predictions').fetchone()[0])
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                'lookups': lookups,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': round(hits / lookups, 4) if lookups else None,
+                'saved_inference_seconds': round(self.saved_seconds, 6),
+                'inference_seconds': round(self.inference_seconds, 6),
+                'memory_entries': len(self._memory),
+                'disk_entries': disk_entries,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """Process-wide prediction cache built from settings"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PredictionCache(settings.FORECAST_PREDICTION_CACHE_PATH,
+                                     settings.FORECAST_PREDICTION_CACHE_SIZE)
+        return _cache
+
+
+def predict(shard, horizon, features):
+    """Prediction of the ``horizon`` model of ``shard`` for one feature vector"""
+    version, model = shard.versioned_model(horizon)
+    row = np.asarray(features, dtype=np.float32).reshape(1, -1)
+    return get_prediction_cache().get_or_compute(
+        shard.slug, horizon, version, row, lambda: model.predict(row)[0])
+
+
+@receiver(setting_changed)
+def _reset_cache(*, setting, **kwargs):
+    global _cache
+    if setting.startswith('FORECAST_PREDICTION_CACHE'):
+        with _cache_lock:
+            _cache = None
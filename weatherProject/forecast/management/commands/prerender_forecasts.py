@@ -0,0 +1,87 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from forecast.bundle import (
+    bundle_dir, date_fingerprints, init_worker, render_dates, renderer_fingerprint, write_atomic,
+)
+from forecast.shards import get_shard
+
+
+class Command(BaseCommand):
+    help = "Render every known forecast date into a precompressed static bundle"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--city', action='append', dest='cities',
+                            help='City slug to render (repeatable, default: all configured cities)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=100, help='dates rendered per task')
+        parser.add_argument('--full', action='store_true',
+                            help='re-render every date instead of only dates whose inputs changed')
+
+    def handle(self, *args, **options):
+        cities = options['cities'] or list(settings.FORECAST_CITIES)
+        unknown = [c for c in cities if c not in settings.FORECAST_CITIES]
+        if unknown:
+            raise CommandError(f"Unknown cities: {', '.join(unknown)}")
+        for slug in cities:
+            self.build_city(slug, options['workers'], options['chunk_size'], options['full'])
+
+    def build_city(self, slug, workers, chunk_size, full):
+        shard = get_shard(slug)
+        out_dir = bundle_dir(slug)
+        manifest_path = os.path.join(out_dir, 'manifest.json')
+
+        previous = {}
+        if not full and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('renderer') == renderer_fingerprint():
+                previous = manifest.get('dates', {})
+
+        fingerprints = date_fingerprints(shard)
+        stale = [d for d, fp in fingerprints.items()
+                 if previous.get(d, {}).get('inputs') != fp
+                 or not all(os.path.exists(os.path.join(out_dir, previous[d][k])) for k in ('html', 'json'))]
+        self.stdout.write(f"{slug}: {len(fingerprints)} dates, {len(stale)} to render")
+
+        os.makedirs(out_dir, exist_ok=True)
+        chunks = [stale[i:i + chunk_size] for i in range(0, len(stale), chunk_size)]
+        rendered = {}
+        if workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+                for entries in pool.map(render_dates, [slug] * len(chunks), chunks):
+                    rendered.update(entries)
+        else:
+            for chunk in chunks:
+                rendered.update(render_dates(slug, chunk))
+
+        dates = {}
+        for d, fp in fingerprints.items():
+            entry = dict(rendered[d]) if d in rendered else dict(previous[d])
+            entry['inputs'] = fp
+            dates[d] = entry
+
+        manifest = {
+            'city': slug,
+            'name': shard.name,
+            'default_date': shard.default_date,
+            'max_date': shard.max_date,
+            'renderer': renderer_fingerprint(),
+            'generated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'dates': dict(sorted(dates.items())),
+        }
+        write_atomic(manifest_path, json.dumps(manifest, indent=1).encode())
+
+        # Drop files the new manifest does not reference (dates removed from the
+        # data, also after --full or a renderer change discarded the old manifest)
+        keep = {entry[kind] for entry in dates.values() for kind in ('html', 'json')}
+        for name in os.listdir(out_dir):
+            if name.endswith(('.gz', '.gz.tmp')) and name not in keep:
+                os.remove(os.path.join(out_dir, name))
+
+        self.stdout.write(self.style.SUCCESS(f"{slug}: bundle written to {out_dir}"))
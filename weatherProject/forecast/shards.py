@@ -0,0 +1,232 @@
+"""Per-city forecast shards.
+
+Each configured city keeps its history, predictions and per-horizon models in
+its own shard. Shards are loaded lazily on first request and kept in a bounded
+LRU, so the number of resident cities never exceeds
+``FORECAST_MAX_RESIDENT_CITIES`` (and, if set, their dataframes never exceed
+``FORECAST_MAX_RESIDENT_BYTES``) no matter how many cities are configured.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class UnknownCity(KeyError):
+    """Raised when a city slug is not present in ``FORECAST_CITIES``"""
+
+
+def _first_existing(paths):
+    """Return the first path in ``paths`` that exists on disk, or None"""
+    for path in paths:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    return [str(value)]
+
+
+def read_shard_csv(paths, label):
+    """Load a CSV from the first existing candidate path (None if missing)"""
+    csv_path = _first_existing(paths)
+    if not csv_path:
+        print(f"✗ {label} CSV not found in: {paths}")
+        return None
+
+    try:
+        df = pd.read_csv(csv_path)
+        df.columns = [c.strip() for c in df.columns]
+        if 'datetime' in df.columns:
+            df['datetime'] = pd.to_datetime(df['datetime'])
+        print(f"✓ {label} CSV loaded from {csv_path} ({len(df)} rows)")
+        return df
+    except Exception as e:
+        print(f"✗ Error loading {label} CSV: {e}")
+        return None
+
+
+class CityShard:
+    """History, predictions and lazily loaded models for a single city"""
+
+    def __init__(self, slug, config):
+        self.slug = slug
+        self.name = config.get('name', slug)
+        self.country = config.get('country', 'VN')
+
+        shard_dir = os.path.join(str(settings.FORECAST_SHARD_ROOT), slug)
+        history_paths = _as_list(config.get('history')) or [os.path.join(shard_dir, 'history.csv')]
+        predictions_paths = _as_list(config.get('predictions')) or [os.path.join(shard_dir, 'predictions.csv')]
+        model_dirs = _as_list(config.get('models')) or [os.path.join(shard_dir, 'models')]
+
+        self.history = read_shard_csv(history_paths, f"{self.name} history")
+        self.predictions = read_shard_csv(predictions_paths, f"{self.name} predictions")
+        self.model_dir = _first_existing(model_dirs)
+        self._models = {}
+        self._versions = {}
+        self._models_lock = threading.Lock()
+
+        self.max_date = None
+        if self.history is not None and 'datetime' in self.history.columns and len(self.history) > 0:
+            self.max_date = self.history['datetime'].max().strftime('%Y-%m-%d')
+        self.default_date = config.get('default_date') or self.max_date
+
+    def model_path(self, horizon):
+        if self.model_dir is None:
+            raise FileNotFoundError(f"No model directory for city '{self.slug}'")
+        return os.path.join(self.model_dir, f"Best_Day {horizon}.pkl")
+
+    def _refresh_version(self, horizon):
+        # Re-hash the artifact only when its size or mtime changed; a new
+        # version drops the loaded model so the next load picks it up
+        path = self.model_path(horizon)
+        stat = os.stat(path)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        cached = self._versions.get(horizon)
+        if cached is None or cached[0] != stamp:
+            digest = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            version = digest.hexdigest()[:16]
+            if cached is not None and cached[1] != version:
+                self._models.pop(horizon, None)
+            self._versions[horizon] = (stamp, version)
+        return self._versions[horizon][1]
+
+    def model_version(self, horizon):
+        """Content hash of the ``horizon`` model artifact"""
+        with self._models_lock:
+            return self._refresh_version(horizon)
+
+    def versioned_model(self, horizon):
+        """``(version, model)`` for ``horizon``, reloading the model if its artifact changed"""
+        with self._models_lock:
+            version = self._refresh_version(horizon)
+            if horizon not in self._models:
+                import joblib
+                self._models[horizon] = joblib.load(self.model_path(horizon))
+            return version, self._models[horizon]
+
+    def model(self, horizon):
+        """Return the best model for ``horizon`` days ahead, loading it on first use"""
+        return self.versioned_model(horizon)[1]
+
+    def memory_usage(self):
+        """Approximate bytes held by this shard's dataframes"""
+        total = 0
+        for df in (self.history, self.predictions):
+            if df is not None:
+                total += int(df.memory_usage(deep=True).sum())
+        return total
+
+
+class ShardStore:
+    """Bounded LRU of resident city shards.
+
+    Shards are evicted coldest first while more than ``max_resident`` are
+    loaded or, when ``max_bytes`` is set, while their combined
+    ``memory_usage()`` exceeds it. The shard just loaded is never evicted.
+    """
+
+    def __init__(self, cities, max_resident, loader=CityShard, max_bytes=None):
+        if max_resident < 1:
+            raise ValueError("max_resident must be at least 1")
+        self.cities = dict(cities)
+        self.max_resident = max_resident
+        self.max_bytes = max_bytes
+        self._loader = loader
+        self._shards = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, slug):
+        """Return the shard for ``slug``, loading it and evicting the coldest shard if needed"""
+        if slug not in self.cities:
+            raise UnknownCity(slug)
+        with self._lock:
+            shard = self._touch(slug)
+            if shard is not None:
+                return shard
+            load_lock = self._load_locks.setdefault(slug, threading.Lock())
+
+        # Read the CSVs outside the store lock so a cold city never blocks
+        # requests for other cities; the per-slug lock stops duplicate loads
+        with load_lock:
+            with self._lock:
+                shard = self._touch(slug)
+                if shard is not None:
+                    return shard
+            shard = self._loader(slug, self.cities[slug])
+            size = shard.memory_usage() if self.max_bytes is not None else 0
+            with self._lock:
+                self._shards[slug] = shard
+                self._sizes[slug] = size
+                self._evict()
+                return shard
+
+    def _evict(self):
+        while len(self._shards) > 1 and (
+                len(self._shards) > self.max_resident
+                or (self.max_bytes is not None and self.resident_bytes() > self.max_bytes)):
+            evicted, _ = self._shards.popitem(last=False)
+            self._sizes.pop(evicted, None)
+            print(f"✓ Evicted forecast shard: {evicted}")
+
+    def _touch(self, slug):
+        shard = self._shards.get(slug)
+        if shard is not None:
+            self._shards.move_to_end(slug)
+        return shard
+
+    def resident(self):
+        """Slugs of currently loaded shards, coldest first"""
+        with self._lock:
+            return list(self._shards)
+
+    def resident_bytes(self):
+        """Measured size of resident shards (0 unless ``max_bytes`` is set)"""
+        return sum(self._sizes.values())
+
+    def clear(self):
+        with self._lock:
+            self._shards.clear()
+            self._sizes.clear()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide shard store built from settings"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ShardStore(settings.FORECAST_CITIES, settings.FORECAST_MAX_RESIDENT_CITIES,
+                                max_bytes=settings.FORECAST_MAX_RESIDENT_BYTES)
+        return _store
+
+
+def get_shard(slug=None):
+    """Resolve ``slug`` (or the default city) to its loaded shard"""
+    return get_store().get(slug or settings.FORECAST_DEFAULT_CITY)
+
+
+@receiver(setting_changed)
+def _reset_store(*, setting, **kwargs):
+    global _store
+    if setting.startswith('FORECAST_'):
+        with _store_lock:
+            _store = None
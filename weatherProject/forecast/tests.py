@@ -1,3 +1,357 @@
-from django.test import TestCase
+import gzip
+import json
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from . import views
+from .inference import PredictionCache, get_prediction_cache, predict
+from .shards import CityShard, ShardStore, UnknownCity, get_store
+
+
+def write_synthetic_city(root, slug, base_temp, days=40):
+    """Write history.csv and predictions.csv for a fake city under root/slug"""
+    city_dir = Path(root) / slug
+    city_dir.mkdir(parents=True)
+    dates = pd.date_range('2025-01-01', periods=days, freq='D')
+    temps = np.round(base_temp + np.sin(np.arange(days) / 5.0), 1)
+    pd.DataFrame({
+        'datetime': dates.strftime('%Y-%m-%d'),
+        'tempmax': temps + 4,
+        'tempmin': temps - 4,
+        'temp': temps,
+        'feelslike': temps + 2,
+        'humidity': 75.0,
+        'precip': 0.0,
+        'windspeed': 10.0,
+        'sealevelpressure': 1010.0,
+        'cloudcover': 50.0,
+        'visibility': 9.0,
+        'conditions': 'Partially cloudy',
+    }).to_csv(city_dir / 'history.csv', index=False)
+    preds = {'datetime': dates.strftime('%Y-%m-%d'), 'temp': temps}
+    for h in range(5):
+        preds[f'Pred_Day {h}'] = temps + 0.1 * h
+    pd.DataFrame(preds).to_csv(city_dir / 'predictions.csv', index=False)
+
+
+class ShardedCityTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.shard_root = tempfile.mkdtemp()
+        cls.cities = {}
+        for i in range(6):
+            slug = f'city-{i}'
+            write_synthetic_city(cls.shard_root, slug, base_temp=20 + i)
+            cls.cities[slug] = {'name': f'City {i}', 'country': 'VN'}
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.shard_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def settings_for(self, max_resident):
+        return override_settings(
+            FORECAST_SHARD_ROOT=self.shard_root,
+            FORECAST_CITIES=self.cities,
+            FORECAST_DEFAULT_CITY='city-0',
+            FORECAST_MAX_RESIDENT_CITIES=max_resident,
+        )
+
+    def test_lru_keeps_resident_cities_bounded(self):
+        with self.settings_for(2):
+            store = ShardStore(self.cities, max_resident=2)
+            for slug in self.cities:
+                store.get(slug)
+                self.assertLessEqual(len(store.resident()), 2)
+            self.assertEqual(store.resident(), ['city-4', 'city-5'])
+
+            # Touching a shard makes it hot, so the other one is evicted next
+            store.get('city-4')
+            store.get('city-0')
+            self.assertEqual(store.resident(), ['city-4', 'city-0'])
+
+    def test_byte_budget_evicts_cold_shards(self):
+        with self.settings_for(10):
+            first = CityShard('city-0', self.cities['city-0'])
+            budget = int(first.memory_usage() * 2.5)
+            store = ShardStore(self.cities, max_resident=10, max_bytes=budget)
+            for slug in self.cities:
+                store.get(slug)
+                self.assertLessEqual(store.resident_bytes(), budget)
+            self.assertEqual(store.resident(), ['city-4', 'city-5'])
+
+    def test_shards_load_lazily(self):
+        loaded = []
+
+        def loader(slug, config):
+            loaded.append(slug)
+            return slug
+
+        store = ShardStore(self.cities, max_resident=3, loader=loader)
+        self.assertEqual(loaded, [])
+        store.get('city-1')
+        store.get('city-1')
+        self.assertEqual(loaded, ['city-1'])
+
+    def test_cold_load_does_not_block_resident_cities(self):
+        release = threading.Event()
+
+        def loader(slug, config):
+            if slug == 'city-1':
+                release.wait(5)
+            return slug
+
+        store = ShardStore(self.cities, max_resident=3, loader=loader)
+        store.get('city-0')
+        cold = threading.Thread(target=store.get, args=('city-1',))
+        cold.start()
+        try:
+            finished = threading.Event()
+            threading.Thread(target=lambda: (store.get('city-0'), finished.set())).start()
+            self.assertTrue(finished.wait(1), 'resident city blocked by a cold load')
+        finally:
+            release.set()
+            cold.join()
+        self.assertEqual(store.resident(), ['city-0', 'city-1'])
+
+    def test_unknown_city_raises(self):
+        store = ShardStore(self.cities, max_resident=2)
+        with self.assertRaises(UnknownCity):
+            store.get('atlantis')
+
+    def test_view_routes_by_query_and_url_segment(self):
+        with self.settings_for(2):
+            response = self.client.get('/', {'city': 'city-3'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['city'], 'City 3')
+
+            response = self.client.get('/city-5/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['city'], 'City 5')
+            self.assertEqual(response.context['max_date'], '2025-02-09')
+
+            response = self.client.get('/')
+            self.assertEqual(response.context['city'], 'City 0')
+            self.assertLessEqual(len(get_store().resident()), 2)
+
+    def test_view_unknown_city_is_404(self):
+        with self.settings_for(2):
+            response = self.client.get('/atlantis/')
+            self.assertEqual(response.status_code, 404)
+
+    def test_city_without_history_does_not_borrow_other_dates(self):
+        cities = dict(self.cities, empty={'name': 'Empty', 'country': 'VN'})
+        with self.settings_for(2), override_settings(FORECAST_CITIES=cities):
+            context = views.build_weather_context(CityShard('empty', cities['empty']))
+        today = timezone.localdate().isoformat()
+        self.assertEqual((context['date'], context['max_date']), (today, today))
+
+
+class PrerenderedBundleTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.shard_root = tempfile.mkdtemp()
+        cls.bundle_root = tempfile.mkdtemp()
+        write_synthetic_city(cls.shard_root, 'city-a', base_temp=25)
+        cls.override = override_settings(
+            FORECAST_SHARD_ROOT=cls.shard_root,
+            FORECAST_BUNDLE_ROOT=cls.bundle_root,
+            FORECAST_CITIES={'city-a': {'name': 'City A', 'country': 'VN'}},
+            FORECAST_DEFAULT_CITY='city-a',
+        )
+        cls.override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.override.disable()
+        shutil.rmtree(cls.shard_root, ignore_errors=True)
+        shutil.rmtree(cls.bundle_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def prerender(self):
+        out = StringIO()
+        call_command('prerender_forecasts', workers=1, stdout=out)
+        return out.getvalue()
+
+    def test_bundle_matches_live_view(self):
+        self.assertIn('40 to render', self.prerender())
+        manifest = json.loads((Path(self.bundle_root) / 'city-a' / 'manifest.json').read_text())
+        self.assertEqual(len(manifest['dates']), 40)
+
+        live = views.weather_view(RequestFactory().get('/', {'date': '2025-01-10'}))
+        response = self.client.get('/', {'date': '2025-01-10'})
+        self.assertEqual(response.content, live.content)
+        response = self.client.get('/', {'date': '2025-01-10'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), live.content)
+
+        chart = self.client.get('/city-a/chart.json', {'date': '2025-01-10'}).json()
+        self.assertEqual(chart['date'], '2025-01-10')
+        self.assertEqual(len(chart['pred_temps']), 5)
+
+    def test_gzip_respects_accept_encoding_q_values(self):
+        self.prerender()
+        for header, gzipped in (('gzip;q=0', False), ('gzip; q=0.0, deflate', False),
+                                ('identity, *;q=0', False), ('br, gzip;q=0.8', True),
+                                ('deflate, *;q=0.5', True), ('GZIP', True)):
+            response = self.client.get('/', {'date': '2025-01-10'}, HTTP_ACCEPT_ENCODING=header)
+            self.assertEqual(response.get('Content-Encoding') == 'gzip', gzipped, header)
+            self.assertIn(b'<html', response.content if not gzipped else gzip.decompress(response.content))
+
+    def test_unknown_date_falls_back_to_live_view(self):
+        self.prerender()
+        response = self.client.get('/', {'date': '1999-01-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_unconfigured_city_is_not_served_from_bundle(self):
+        self.prerender()
+        self.assertEqual(self.client.get('/', {'city': '../city-a'}).status_code, 404)
+        # A city dropped from settings 404s even though its bundle is still on disk
+        with override_settings(FORECAST_CITIES={'city-b': {'name': 'City B'}}, FORECAST_DEFAULT_CITY='city-b'):
+            self.assertEqual(self.client.get('/city-a/', {'date': '2025-01-10'}).status_code, 404)
+            self.assertEqual(self.client.get('/city-a/chart.json', {'date': '2025-01-10'}).status_code, 404)
+
+    def test_full_rebuild_removes_files_of_dropped_dates(self):
+        self.prerender()
+        out_dir = Path(self.bundle_root) / 'city-a'
+        history_path = Path(self.shard_root) / 'city-a' / 'history.csv'
+        original = history_path.read_text()
+        try:
+            history = pd.read_csv(history_path)
+            history[history['datetime'] != '2025-01-05'].to_csv(history_path, index=False)
+            get_store().clear()
+            call_command('prerender_forecasts', workers=1, full=True, stdout=StringIO())
+            self.assertFalse((out_dir / '2025-01-05.html.gz').exists())
+            self.assertFalse((out_dir / '2025-01-05.json.gz').exists())
+            self.assertTrue((out_dir / '2025-01-06.html.gz').exists())
+        finally:
+            history_path.write_text(original)
+            get_store().clear()
+
+    def test_incremental_rebuild_only_renders_changed_dates(self):
+        self.prerender()
+        self.assertIn('0 to render', self.prerender())
+
+        history_path = Path(self.shard_root) / 'city-a' / 'history.csv'
+        original = history_path.read_text()
+        try:
+            history = pd.read_csv(history_path)
+            history.loc[history['datetime'] == '2025-01-20', 'humidity'] = 90.0
+            history.to_csv(history_path, index=False)
+            get_store().clear()
+            # 2025-01-20 and the seven days before it show that row
+            self.assertIn('8 to render', self.prerender())
+        finally:
+            history_path.write_text(original)
+            get_store().clear()
+
+
+class PredictionCacheTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        write_synthetic_city(self.tmp, 'city-m', base_temp=25)
+        self.model_dir = Path(self.tmp) / 'city-m' / 'models'
+        self.model_dir.mkdir()
+        self.write_model(slope=1.0)
+        self.db_path = Path(self.tmp) / 'cache.sqlite3'
+        self.override = override_settings(
+            FORECAST_SHARD_ROOT=self.tmp,
+            FORECAST_PREDICTION_CACHE_PATH=self.db_path,
+            FORECAST_PREDICTION_CACHE_SIZE=16,
+        )
+        self.override.enable()
+        self.shard = CityShard('city-m', {})
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def write_model(self, slope):
+        import joblib
+        from sklearn.linear_model import LinearRegression
+        X = np.arange(12, dtype=float).reshape(-1, 3)
+        model = LinearRegression().fit(X, slope * X.sum(axis=1))
+        joblib.dump(model, self.model_dir / 'Best_Day 0.pkl')
+
+    def test_memory_then_disk_tier(self):
+        features = [1.0, 2.0, 3.0]
+        self.assertAlmostEqual(predict(self.shard, 0, features), 6.0, places=4)
+        self.assertAlmostEqual(predict(self.shard, 0, features), 6.0, places=4)
+        stats = get_prediction_cache().stats()
+        self.assertEqual((stats['misses'], stats['memory_hits']), (1, 1))
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+        # A fresh process-level cache (e.g. after a restart) is served from SQLite
+        restarted = PredictionCache(self.db_path, max_entries=16)
+        value = restarted.get_or_compute('city-m', 0, self.shard.model_version(0),
+                                         np.asarray([features], dtype=np.float32),
+                                         lambda: self.fail('should be a disk hit'))
+        self.assertAlmostEqual(value, 6.0, places=4)
+        self.assertEqual(restarted.stats()['disk_hits'], 1)
+
+    def test_new_artifact_invalidates_entries(self):
+        features = [1.0, 2.0, 3.0]
+        old_version = self.shard.model_version(0)
+        predict(self.shard, 0, features)
+
+        self.write_model(slope=2.0)
+        self.assertNotEqual(self.shard.model_version(0), old_version)
+        self.assertAlmostEqual(predict(self.shard, 0, features), 12.0, places=4)
+        stats = get_prediction_cache().stats()
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['disk_entries'], 1)
+
+    def test_memory_hits_do_not_wait_for_sqlite(self):
+        import sqlite3
+        import time
+        predict(self.shard, 0, [1.0, 2.0, 3.0])
+
+        # Another worker holds the write lock, so this thread's miss blocks on INSERT
+        blocker = sqlite3.connect(self.db_path)
+        blocker.execute('BEGIN IMMEDIATE')
+        miss = threading.Thread(target=predict, args=(self.shard, 0, [4.0, 5.0, 6.0]))
+        miss.start()
+        try:
+            time.sleep(0.2)
+            started = time.perf_counter()
+            predict(self.shard, 0, [1.0, 2.0, 3.0])
+            self.assertLess(time.perf_counter() - started, 1.0)
+        finally:
+            blocker.rollback()
+            blocker.close()
+            miss.join()
+
+    def test_unwritable_cache_path_falls_back_to_memory(self):
+        blocker = Path(self.tmp) / 'not-a-directory'
+        blocker.write_text('')
+        with override_settings(FORECAST_PREDICTION_CACHE_PATH=blocker / 'cache.sqlite3'):
+            with self.assertLogs('forecast.inference', level='WARNING') as logs:
+                self.assertAlmostEqual(predict(self.shard, 0, [1.0, 2.0, 3.0]), 6.0, places=4)
+                self.assertAlmostEqual(predict(self.shard, 0, [1.0, 2.0, 3.0]), 6.0, places=4)
+                self.assertAlmostEqual(predict(self.shard, 0, [2.0, 2.0, 3.0]), 7.0, places=4)
+            self.assertEqual(len(logs.records), 1)
+            stats = get_prediction_cache().stats()
+        self.assertEqual((stats['misses'], stats['memory_hits']), (2, 1))
+        self.assertIsNone(stats['disk_entries'])
+
+    def test_stats_endpoint_does_not_create_database(self):
+        response = self.client.get('/prediction-cache.json')
+        self.assertIsNone(response.json()['disk_entries'])
+        self.assertFalse(self.db_path.exists())
+
+    def test_stats_endpoint(self):
+        predict(self.shard, 0, [1.0, 2.0, 3.0])
+        response = self.client.get('/prediction-cache.json')
+        self.assertEqual(response.json()['misses'], 1)
@@ -2,4 +2,8 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('', views.weather_view, name='weather_view'),]
\ No newline at end of file
+    path('', views.bundled_weather_view, name='weather_view'),
+    path('chart.json', views.chart_view, name='weather_chart'),
+    path('prediction-cache.json', views.prediction_cache_stats_view, name='prediction_cache_stats'),
+    path('<slug:city>/', views.bundled_weather_view, name='weather_city_view'),
+    path('<slug:city>/chart.json', views.chart_view, name='weather_city_chart'),]
@@ -1,91 +1,23 @@
 from django.shortcuts import render
 from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.utils import timezone
 import pandas as pd
 from datetime import datetime, timedelta
-import os
 import json
 
-# Load historical data once at module level for performance
-def load_historical_features():
-    """Load historical weather features from CSV"""
-    # Try multiple possible paths (works on both local and Render)
-    possible_paths = [
-        os.path.join(settings.BASE_DIR, 'data', 'HCMWeatherDaily_Cleaned.csv'),
-        os.path.join(settings.BASE_DIR, 'HCMWeatherDaily_Cleaned.csv'),
-        os.path.join(settings.BASE_DIR, '..', 'data', 'HCMWeatherDaily_Cleaned.csv'),
-        os.path.join(settings.BASE_DIR, '..', 'HCMWeatherDaily_Cleaned.csv'),
-    ]
-    
-    csv_path = None
-    for path in possible_paths:
-        if os.path.exists(path):
-            csv_path = path
-            print(f"✓ Found CSV at: {csv_path}")
-            break
-    
-    if not csv_path:
-        print(f"✗ CSV not found in: {possible_paths}")
-        print(f"  BASE_DIR = {settings.BASE_DIR}")
-        return None
-    
-    try:
-        df = pd.read_csv(csv_path)
-        if 'datetime' in df.columns:
-            df['datetime'] = pd.to_datetime(df['datetime'])
-        print(f"✓ CSV loaded successfully ({len(df)} rows)")
-        return df
-    except Exception as e:
-        print(f"✗ Error loading CSV: {e}")
-        return None
-
-# Cache the historical data
-_historical_data = load_historical_features()
-
-# Load predicted data once at module level for performance
-def load_predicted_data():
-    """Load predicted temperatures from CSV (supports multiple filenames)"""
-    possible_paths = [
-        os.path.join(settings.BASE_DIR, 'data', 'predict_dataset.csv'),
-        os.path.join(settings.BASE_DIR, 'data', 'predicted_data.csv'),
-        os.path.join(settings.BASE_DIR, 'predict_dataset.csv'),
-        os.path.join(settings.BASE_DIR, 'predicted_data.csv'),
-        os.path.join(settings.BASE_DIR, '..', 'data', 'predict_dataset.csv'),
-        os.path.join(settings.BASE_DIR, '..', 'data', 'predicted_data.csv'),
-    ]
-
-    csv_path = None
-    for path in possible_paths:
-        if os.path.exists(path):
-            csv_path = path
-            print(f"✓ Found predicted CSV at: {csv_path}")
-            break
-
-    if not csv_path:
-        print(f"✗ Predicted CSV not found in: {possible_paths}")
-        return None
+from .bundle import prebuilt_response
+from .inference import get_prediction_cache
+from .shards import UnknownCity, get_shard
 
-    try:
-        df = pd.read_csv(csv_path)
-        if 'datetime' in df.columns:
-            df['datetime'] = pd.to_datetime(df['datetime'])
-        # Normalize column names for ease of access
-        df.columns = [c.strip() for c in df.columns]
-        return df
-    except Exception as e:
-        print(f"✗ Error loading predicted CSV: {e}")
-        return None
-
-_predicted_data = load_predicted_data()
-
-def get_recent_features(days_back=30):
+def get_recent_features(historical_data, days_back=30):
     """Get recent historical features for context and latest weather data"""
-    global _historical_data
-    if _historical_data is None:
+    if historical_data is None:
         return None
     
     # Get last N days of data
-    recent_data = _historical_data.tail(days_back)
-    latest_record = _historical_data.iloc[-1] if len(_historical_data) > 0 else None
+    recent_data = historical_data.tail(days_back)
+    latest_record = historical_data.iloc[-1] if len(historical_data) > 0 else None
     
     # Extract key statistics
     features = {
@@ -159,42 +91,98 @@ def get_css_class_from_condition(description):
     else:
         return css_class
 
-def weather_view(request):
+def resolve_city_slug(request, city=None):
+    """City from the URL segment or ?city= (default city otherwise)"""
+    return city or request.GET.get('city') or settings.FORECAST_DEFAULT_CITY
+
+
+def weather_view(request, city=None):
+    city_slug = resolve_city_slug(request, city)
+    try:
+        shard = get_shard(city_slug)
+    except UnknownCity:
+        raise Http404(f"Unknown city: {city_slug}")
+    weather_data = build_weather_context(shard, request.GET.get('date'))
+    return render(request, 'weather.html', weather_data)
+
+
+def bundled_weather_view(request, city=None):
+    """Serve the prerendered page for a known date, rendering live otherwise"""
+    response = prebuilt_response(request, resolve_city_slug(request, city), request.GET.get('date'), 'html')
+    return response or weather_view(request, city)
+
+
+def chart_view(request, city=None):
+    """Chart series for a date as JSON (prerendered when available)"""
+    city_slug = resolve_city_slug(request, city)
+    response = prebuilt_response(request, city_slug, request.GET.get('date'), 'json')
+    if response is not None:
+        return response
+    try:
+        shard = get_shard(city_slug)
+    except UnknownCity:
+        raise Http404(f"Unknown city: {city_slug}")
+    return JsonResponse(chart_payload(build_weather_context(shard, request.GET.get('date'))))
+
+
+def prediction_cache_stats_view(request):
+    """Hit ratio and saved inference time of this worker's prediction cache"""
+    return JsonResponse(get_prediction_cache().stats())
+
+
+def chart_payload(weather_data):
+    """Chart series from a weather context"""
+    return {
+        'city': weather_data['city_slug'],
+        'date': weather_data['date'],
+        'times': json.loads(weather_data['week_times']),
+        'actual_temps': json.loads(weather_data['week_actual_temps']),
+        'pred_temps': json.loads(weather_data['week_pred_temps']),
+    }
+
+
+def build_weather_context(shard, selected_date_str=None):
+    """Template context for ``shard`` on ``selected_date_str`` (default date if None)"""
+    historical_data = shard.history
+    predicted_data = shard.predictions
+    # A city without history has no dates of its own; show today rather than another city's
+    today_str = timezone.localdate().isoformat()
+    default_date_str = shard.default_date or today_str
+
     # Load historical features from CSV
-    recent_features = get_recent_features(days_back=30)
-    # Determine if user selected a date via query parameter
-    selected_date_str = request.GET.get('date')
+    recent_features = get_recent_features(historical_data, days_back=30)
     selected_record = None
 
-    if _historical_data is not None and 'datetime' in _historical_data.columns:
+    if historical_data is not None and 'datetime' in historical_data.columns:
         if selected_date_str:
             try:
                 parsed_date = pd.to_datetime(selected_date_str).date()
                 # Filter rows matching the selected date (date-only comparison)
-                matching_rows = _historical_data[_historical_data['datetime'].dt.date == parsed_date]
+                matching_rows = historical_data[historical_data['datetime'].dt.date == parsed_date]
                 if not matching_rows.empty:
                     selected_record = matching_rows.iloc[-1]
             except Exception:
                 # Ignore parsing errors; will fallback to default
                 pass
-        # Fallback to 2025-10-04 if no date selected
+        # Fallback to the city's default date if no date selected
         if selected_record is None:
             try:
-                default_date = pd.to_datetime('2025-10-04').date()
-                matching_rows = _historical_data[_historical_data['datetime'].dt.date == default_date]
+                default_date = pd.to_datetime(default_date_str).date()
+                matching_rows = historical_data[historical_data['datetime'].dt.date == default_date]
                 if not matching_rows.empty:
                     selected_record = matching_rows.iloc[-1]
-                    selected_date_str = '2025-10-04'  # Set the date string to default
+                    selected_date_str = default_date_str  # Set the date string to default
             except Exception:
                 # Final fallback to latest record
-                if len(_historical_data) > 0:
-                    selected_record = _historical_data.iloc[-1]
+                if len(historical_data) > 0:
+                    selected_record = historical_data.iloc[-1]
 
     # Build base weather_data (defaults)
     weather_data = {
-        'date': selected_date_str if selected_date_str else '2025-10-04',
-        'city': 'Ho Chi Minh City',
-        'country': 'VN',
+        'date': selected_date_str if selected_date_str else default_date_str,
+        'city': shard.name,
+        'city_slug': shard.slug,
+        'country': shard.country,
         'description': 'clear',
         # Default numeric values (used if no record is found)
         'current_temp': 29,
@@ -206,18 +194,19 @@ def weather_view(request):
         'visibility': 8000,
         'MaxTemp': 32,
         'Mintemp': 25,
-        'max_date': '2025-10-08',  # Maximum date in dataset - forecast will show available days only
+        'max_date': shard.max_date or today_str,  # Maximum date in dataset - forecast will show available days only
     }
 
     # If we have a record (selected or latest), populate weather_data
+    forecast_box_horizon = 0
     if selected_record is not None:
         record = selected_record
         
         # Get predicted temperature for today (Pred_Day 0) from predicted CSV
         predicted_temp_today = None
-        if _predicted_data is not None and 'datetime' in _predicted_data.columns:
+        if predicted_data is not None and 'datetime' in predicted_data.columns:
             try:
-                pred_df = _predicted_data.copy()
+                pred_df = predicted_data.copy()
                 pred_df['date_only'] = pred_df['datetime'].dt.date
                 parsed_date = pd.to_datetime(str(record.get('datetime', weather_data['date']))[:10]).date()
                 matching_pred = pred_df[pred_df['date_only'] == parsed_date]
@@ -261,9 +250,9 @@ def weather_view(request):
             current_date = datetime.now().date()
 
         horizon = 7
-        if _predicted_data is not None and 'datetime' in _predicted_data.columns:
+        if predicted_data is not None and 'datetime' in predicted_data.columns:
             try:
-                pred_df_h = _predicted_data.copy()
+                pred_df_h = predicted_data.copy()
                 pred_df_h['date_only'] = pred_df_h['datetime'].dt.date
                 row_h = pred_df_h[pred_df_h['date_only'] == current_date]
                 if not row_h.empty:
@@ -289,7 +278,7 @@ def weather_view(request):
 
         # Build a forecast starting from TODAY (D+0) with dynamic horizon
         # D+0 = today (selected date), D+1 = tomorrow, etc.
-        df = _historical_data
+        df = historical_data
         forecast_subset = None
         actual_horizon = horizon  # Track actual available days
         if df is not None and 'datetime' in df.columns:
@@ -310,9 +299,9 @@ def weather_view(request):
         if forecast_subset is not None and len(forecast_subset) > 0:
             # Get predicted temperatures from predicted CSV for each day
             pred_temps_map = {}  # Map day index to predicted temp
-            if _predicted_data is not None and 'datetime' in _predicted_data.columns:
+            if predicted_data is not None and 'datetime' in predicted_data.columns:
                 try:
-                    pred_df = _predicted_data.copy()
+                    pred_df = predicted_data.copy()
                     pred_df['date_only'] = pred_df['datetime'].dt.date
                     matching_pred = pred_df[pred_df['date_only'] == current_date]
                     if not matching_pred.empty:
@@ -390,9 +379,9 @@ def weather_view(request):
 
     # Determine prediction horizon from predicted columns (typically 5)
     pred_horizon = 5  # default
-    if _predicted_data is not None and 'datetime' in _predicted_data.columns:
+    if predicted_data is not None and 'datetime' in predicted_data.columns:
         try:
-            pred_df_h2 = _predicted_data.copy()
+            pred_df_h2 = predicted_data.copy()
             pred_df_h2['date_only'] = pred_df_h2['datetime'].dt.date
             row_h2 = pred_df_h2[pred_df_h2['date_only'] == base_date]
             if not row_h2.empty:
@@ -422,8 +411,8 @@ def weather_view(request):
 
     # Actual temps from historical data if available for those dates (may have gaps)
     week_actual_temps = []
-    if _historical_data is not None and 'datetime' in _historical_data.columns:
-        hist_by_date = _historical_data.copy()
+    if historical_data is not None and 'datetime' in historical_data.columns:
+        hist_by_date = historical_data.copy()
         hist_by_date['date_only'] = hist_by_date['datetime'].dt.date
         hist_map = hist_by_date.set_index('date_only')
         for d in forecast_dates:
@@ -449,9 +438,9 @@ def weather_view(request):
     # Predicted temps based on the SELECTED DATE row's Pred_Day N columns
     # Pred_Day 0 = today's prediction, Pred_Day 1 = tomorrow's prediction, etc.
     week_pred_temps = [None] * horizon
-    if _predicted_data is not None and 'datetime' in _predicted_data.columns:
+    if predicted_data is not None and 'datetime' in predicted_data.columns:
         try:
-            pred_df = _predicted_data.copy()
+            pred_df = predicted_data.copy()
             pred_df['date_only'] = pred_df['datetime'].dt.date
             base_row = pred_df[pred_df['date_only'] == base_date]
             if not base_row.empty:
@@ -504,5 +493,5 @@ def weather_view(request):
             'hum': weather_data.get(f'hum{i}', None)
         })
     weather_data['forecast_items'] = forecast_items
-    
-    return render(request, 'weather.html', weather_data)
+
+    return weather_data
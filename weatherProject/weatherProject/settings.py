@@ -121,3 +121,56 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Forecast shards
+# Each city's history, predictions and per-horizon models live in their own
+# shard under FORECAST_SHARD_ROOT/<slug>/ (history.csv, predictions.csv,
+# models/Best_Day N.pkl) unless explicit paths are given. Shards load lazily
+# on first request; at most FORECAST_MAX_RESIDENT_CITIES stay in memory, and
+# if FORECAST_MAX_RESIDENT_BYTES is set, cold shards are also evicted while the
+# resident history/prediction dataframes exceed that many bytes (loaded models
+# are not measured, so the city count is what bounds them).
+
+FORECAST_SHARD_ROOT = BASE_DIR.parent / 'data' / 'cities'
+
+FORECAST_DEFAULT_CITY = 'ho-chi-minh-city'
+
+FORECAST_MAX_RESIDENT_CITIES = 8
+
+FORECAST_MAX_RESIDENT_BYTES = None
+
+FORECAST_CITIES = {
+    'ho-chi-minh-city': {
+        'name': 'Ho Chi Minh City',
+        'country': 'VN',
+        'default_date': '2025-10-04',
+        'history': [
+            BASE_DIR / 'data' / 'HCMWeatherDaily_Cleaned.csv',
+            BASE_DIR / 'HCMWeatherDaily_Cleaned.csv',
+            BASE_DIR.parent / 'data' / 'HCMWeatherDaily_Cleaned.csv',
+            BASE_DIR.parent / 'HCMWeatherDaily_Cleaned.csv',
+        ],
+        'predictions': [
+            BASE_DIR / 'data' / 'predict_dataset.csv',
+            BASE_DIR / 'data' / 'predicted_data.csv',
+            BASE_DIR / 'predict_dataset.csv',
+            BASE_DIR / 'predicted_data.csv',
+            BASE_DIR.parent / 'data' / 'predict_dataset.csv',
+            BASE_DIR.parent / 'data' / 'predicted_data.csv',
+        ],
+        'models': [
+            BASE_DIR / 'best_models',
+            BASE_DIR.parent / 'best_models',
+        ],
+    },
+}
+
+# Prerendered pages written by `manage.py prerender_forecasts`, one directory per city
+FORECAST_BUNDLE_ROOT = BASE_DIR / 'bundle'
+
+# Memoized model predictions: an in-process LRU of FORECAST_PREDICTION_CACHE_SIZE
+# entries in front of a SQLite file shared by all workers (None disables it)
+FORECAST_PREDICTION_CACHE_PATH = BASE_DIR / 'prediction_cache.sqlite3'
+
+FORECAST_PREDICTION_CACHE_SIZE = 4096